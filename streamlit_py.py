@@ -1,16 +1,130 @@
 import streamlit as st
-import xml.etree.ElementTree as ET
+try:
+    from lxml import etree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
 import os
-import zipfile
 import tempfile
-import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from xml.sax.saxutils import escape, quoteattr
 from datetime import datetime
-import base64
+import html
 import io
 import re
+import traceback
+from html.parser import HTMLParser
 
 st.set_page_config(page_title="Rise TinCan to IMSCC Converter", page_icon="📚", layout="wide")
 
+# Template for the wiki page wrapping each Rise lesson in an iframe; built
+# once here so per-lesson rendering is a single .format call
+_PAGE_TEMPLATE = """<html>
+<head>
+<meta http-equiv="Content-Type" content="text/html; charset=utf-8"/>
+<title>{lesson_title}</title>
+<meta name="identifier" content="{identifier}"/>
+<meta name="editing_roles" content="teachers"/>
+<meta name="workflow_state" content="active"/>
+</head>
+<body>
+<p><iframe style="overflow: hidden; height: 720px; width: 100%;" src="{base_url}/index.html#/{url_format}/{lesson_id}" loading="lazy"></iframe></p>
+</body>
+</html>"""
+
+# Canvas course_settings files that never vary between builds, plus the
+# course_settings.xml template whose identifier/title are filled per build
+_COURSE_SETTINGS_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<course identifier="{course_id}" xmlns="http://canvas.instructure.com/xsd/cccv1p0" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://canvas.instructure.com/xsd/cccv1p0 https://canvas.instructure.com/xsd/cccv1p0.xsd">
+  <title>{course_title}</title>
+  <course_code></course_code>
+  <locale>en</locale>
+  <settings>
+    <setting name="hide_final_grades">false</setting>
+    <setting name="allow_student_discussion_topics">true</setting>
+    <setting name="allow_student_discussion_editing">true</setting>
+    <setting name="allow_student_forum_attachments">false</setting>
+    <setting name="allow_student_organized_groups">false</setting>
+    <setting name="show_all_discussion_entries">false</setting>
+    <setting name="is_public">false</setting>
+    <setting name="open_enrollment">false</setting>
+    <setting name="allow_wiki_comments">false</setting>
+    <setting name="self_enrollment">false</setting>
+    <setting name="allow_student_assignment_edits">false</setting>
+    <setting name="allow_student_discussion_reporting">true</setting>
+    <setting name="restrict_student_past_view">false</setting>
+    <setting name="restrict_student_future_view">false</setting>
+    <setting name="grading_standard_enabled">false</setting>
+  </settings>
+  <date_format>iso8601</date_format>
+</course>
+"""
+
+_STATIC_COURSE_SETTINGS = {
+    "course_settings/canvas_export.txt": "1",
+    "course_settings/assignment_groups.xml": """<?xml version="1.0" encoding="UTF-8"?>
+<assignmentGroups xmlns="http://canvas.instructure.com/xsd/cccv1p0" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://canvas.instructure.com/xsd/cccv1p0 https://canvas.instructure.com/xsd/cccv1p0.xsd">
+</assignmentGroups>
+""",
+    "course_settings/files_meta.xml": """<?xml version="1.0" encoding="UTF-8"?>
+<files xmlns="http://canvas.instructure.com/xsd/cccv1p0" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://canvas.instructure.com/xsd/cccv1p0 https://canvas.instructure.com/xsd/cccv1p0.xsd">
+</files>
+""",
+    "course_settings/media_tracks.xml": """<?xml version="1.0" encoding="UTF-8"?>
+<media_tracks xmlns="http://canvas.instructure.com/xsd/cccv1p0" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://canvas.instructure.com/xsd/cccv1p0 https://canvas.instructure.com/xsd/cccv1p0.xsd">
+</media_tracks>
+""",
+    "course_settings/context.xml": """<?xml version="1.0" encoding="UTF-8"?>
+<course_components xmlns="http://canvas.instructure.com/xsd/cccv1p0" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://canvas.instructure.com/xsd/cccv1p0 https://canvas.instructure.com/xsd/cccv1p0.xsd">
+  <resource content_type="associated_content" identifierref="" intendeduse="syllabus" type="syllabus">
+  </resource>
+</course_components>
+"""
+}
+
+# Static manifest skeleton; only the identifier, escaped title and the
+# organization/resource bodies vary per build
+_MANIFEST_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<manifest identifier="manifest_{manifest_id}" 
+         xmlns="http://www.imsglobal.org/xsd/imsccv1p1/imscp_v1p1" 
+         xmlns:lom="http://ltsc.ieee.org/xsd/imsccv1p1/LOM/resource" 
+         xmlns:lomimscc="http://ltsc.ieee.org/xsd/imsccv1p1/LOM/manifest" 
+         xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
+         xsi:schemaLocation="http://www.imsglobal.org/xsd/imsccv1p1/imscp_v1p1 http://www.imsglobal.org/profile/cc/ccv1p1/ccv1p1_imscp_v1p2_v1p0.xsd http://ltsc.ieee.org/xsd/imsccv1p1/LOM/resource http://www.imsglobal.org/profile/cc/ccv1p1/LOM/ccv1p1_lomresource_v1p0.xsd http://ltsc.ieee.org/xsd/imsccv1p1/LOM/manifest http://www.imsglobal.org/profile/cc/ccv1p1/LOM/ccv1p1_lommanifest_v1p0.xsd">
+  <metadata>
+    <schema>IMS Common Cartridge</schema>
+    <schemaversion>1.1.0</schemaversion>
+    <lomimscc:lom>
+      <lomimscc:general>
+        <lomimscc:title>
+          <lomimscc:string>{course_title}</lomimscc:string>
+        </lomimscc:title>
+      </lomimscc:general>
+    </lomimscc:lom>
+  </metadata>
+  {organizations}
+  <resources>
+    {resources}
+  </resources>
+</manifest>
+"""
+
+# Courses below this page count render inline; the thread pool only pays
+# for itself once there are enough pages to amortize worker startup
+_PARALLEL_RENDER_MIN = 32
+
+# Patterns compiled once at import time instead of per call
+_SAFE_STRIP_RE = re.compile(r'[^\w\s-]')
+_SAFE_DASH_RE = re.compile(r'[-\s]+')
+# Clark-notation tags for the tincan namespace, built once at import time;
+# plain-tag find() takes a fast path that skips prefix/path resolution
+_TINCAN_NS = '{http://projecttincan.com/tincan.xsd}'
+_ACTIVITY_TAG = _TINCAN_NS + 'activity'
+_NAME_TAG = _TINCAN_NS + 'name'
+_DESC_TAG = _TINCAN_NS + 'description'
+
 st.title("Rise TinCan to IMSCC Converter")
 st.write("This app converts a Rise TinCan XML file into an IMSCC package for Canvas.")
 
@@ -38,53 +152,85 @@ st.subheader("Additional HTML Pages")
 st.write("Upload any additional HTML files you want to include as wiki content in your IMSCC package.")
 additional_html_files = st.file_uploader("Upload HTML files", type=["html"], accept_multiple_files=True)
 
-def extract_activities(xml_content):
-    """Extract activities marked as blocks and sections from tincan XML"""
-    root = ET.fromstring(xml_content)
-    
-    # Define namespaces
-    namespaces = {
-        'tincan': 'http://projecttincan.com/tincan.xsd',
-        'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
-        'xsd': 'http://www.w3.org/2001/XMLSchema'
-    }
-    
+# Compression level for the generated package
+compress_level = st.sidebar.slider(
+    "ZIP compression level", min_value=1, max_value=9, value=1,
+    help="1 is fastest and is usually plenty for the small generated files; "
+         "higher levels shrink the package slightly at the cost of generation time."
+)
+
+@dataclass(slots=True)
+class Activity:
+    """One block or section activity extracted from tincan.xml"""
+    id: str
+    full_id: str
+    name: str
+    description: str
+    type: str
+    identifier: str = ''
+    safe_filename: str = ''
+
+@st.cache_data(show_spinner=False)
+def parse_tincan(xml_bytes):
+    """Stream-parse tincan XML content in a single pass.
+
+    Collects activities marked as blocks and sections along with the course
+    title/description. Each activity subtree is discarded right after it is
+    handled, so peak memory is the document skeleton plus one activity
+    rather than the fully populated tree. Returns a (activities,
+    course_info) tuple. Cached on the uploaded bytes so Streamlit reruns
+    after widget interactions skip the re-parse.
+    """
     activities = []
-    
-    # Find all activities
-    for activity in root.findall('.//tincan:activity', namespaces):
-        activity_id = activity.get('id')
-        activity_type = activity.get('type')
-        
-        # Get name and check if it's a block or section
-        name_elem = activity.find('./tincan:name', namespaces)
-        if name_elem is not None:
-            name = name_elem.text
-            
-            # Check if name ends with /blocks or /section
-            is_block = name.endswith('/blocks')
-            is_section = name.endswith('/section')
-            
-            if is_block or is_section:
+    course_info = {'title': "Untitled Course", 'description': ""}
+
+    for event, elem in ET.iterparse(io.BytesIO(xml_bytes), events=('end',)):
+        # Only activity elements matter. Clearing happens at the activity
+        # level once its children have been read — clearing other elements
+        # here would wipe name/description before their parent's end event
+        if elem.tag != _ACTIVITY_TAG:
+            continue
+
+        activity_id = elem.get('id')
+        activity_type = elem.get('type')
+
+        name_elem = elem.find(_NAME_TAG)
+        name = name_elem.text if name_elem is not None else None
+
+        if activity_type == 'http://adlnet.gov/expapi/activities/course':
+            # The course activity carries the overall title and description
+            desc_elem = elem.find(_DESC_TAG)
+            course_info = {
+                'title': name if name else "Untitled Course",
+                'description': desc_elem.text if desc_elem is not None else ""
+            }
+        elif name is not None:
+            # One rpartition gives both the clean name and the /blocks or
+            # /section suffix in a single scan; the separator must be
+            # present, so a name that is exactly 'blocks' does not match
+            clean_name, sep, suffix = name.rpartition('/')
+
+            if sep and suffix in ('blocks', 'section'):
                 # Extract the ID part from the full activity ID
-                lesson_id = activity_id.split('/')[-1]
-                
+                lesson_id = activity_id.rpartition('/')[2]
+
                 # Get description
-                description_elem = activity.find('./tincan:description', namespaces)
+                description_elem = elem.find(_DESC_TAG)
                 description = description_elem.text if description_elem is not None else ""
-                
-                # Clean up name by removing the /blocks or /section suffix
-                clean_name = name.replace('/blocks', '').replace('/section', '')
-                
-                activities.append({
-                    'id': lesson_id,
-                    'full_id': activity_id,
-                    'name': clean_name,
-                    'description': description,
-                    'type': 'block' if is_block else 'section'
-                })
-    
-    return activities
+
+                activities.append(Activity(
+                    id=lesson_id,
+                    full_id=activity_id,
+                    name=clean_name,
+                    description=description,
+                    type='block' if suffix == 'blocks' else 'section'
+                ))
+
+        # Drop the processed activity subtree; the emptied element itself
+        # stays attached to the root until parsing finishes
+        elem.clear()
+
+    return activities, course_info
 
 def organize_activities(activities):
     """Organize activities into modules and pages based on sections and blocks"""
@@ -92,56 +238,34 @@ def organize_activities(activities):
     current_module = None
     
     for activity in activities:
-        if activity['type'] == 'section':
+        if activity.type == 'section':
             # Start a new module
             current_module = {
-                'title': activity['name'],
-                'id': activity['id'],
+                'title': activity.name,
+                'id': activity.id,
                 'pages': []
             }
             modules.append(current_module)
-        elif activity['type'] == 'block' and current_module is not None:
+        elif activity.type == 'block' and current_module is not None:
             # Add block as a page to the current module
             current_module['pages'].append(activity)
     
     return modules
 
-def get_course_info(xml_content):
-    """Extract course title and description from tincan XML"""
-    root = ET.fromstring(xml_content)
-    
-    namespaces = {
-        'tincan': 'http://projecttincan.com/tincan.xsd',
-        'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
-        'xsd': 'http://www.w3.org/2001/XMLSchema'
-    }
-    
-    # Find the course activity (first activity of type course)
-    course_activity = root.find('.//tincan:activity[@type="http://adlnet.gov/expapi/activities/course"]', namespaces)
-    
-    if course_activity is not None:
-        name_elem = course_activity.find('./tincan:name', namespaces)
-        desc_elem = course_activity.find('./tincan:description', namespaces)
-        
-        course_title = name_elem.text if name_elem is not None else "Untitled Course"
-        course_description = desc_elem.text if desc_elem is not None else ""
-        
-        return {
-            'title': course_title,
-            'description': course_description
-        }
-    
-    return {'title': "Untitled Course", 'description': ""}
-
+@lru_cache(maxsize=None)
 def create_safe_filename(title):
     """Create a safe filename from a title"""
-    safe_title = re.sub(r'[^\w\s-]', '', title.lower().strip())
-    safe_title = re.sub(r'[-\s]+', '-', safe_title)
+    safe_title = _SAFE_STRIP_RE.sub('', title.lower().strip())
+    safe_title = _SAFE_DASH_RE.sub('-', safe_title)
     return safe_title
 
+def _gid(n=32):
+    """Generate a random hex identifier of n characters"""
+    return os.urandom(n // 2).hex()
+
 def generate_page_identifier():
     """Generate a unique identifier for a page"""
-    return f"g{uuid.uuid4().hex[:32]}"
+    return f"g{_gid(32)}"
 
 def create_html_page(lesson_id, lesson_title, base_url, url_format="blocks", identifier=None):
     """Create an HTML page with an iframe pointing to the Rise content"""
@@ -149,97 +273,128 @@ def create_html_page(lesson_id, lesson_title, base_url, url_format="blocks", ide
     # Use provided identifier or create a new one
     if not identifier:
         identifier = generate_page_identifier()
-    
-    safe_title = create_safe_filename(lesson_title)
-    
-    html_template = f"""<html>
-<head>
-<meta http-equiv="Content-Type" content="text/html; charset=utf-8"/>
-<title>{lesson_title}</title>
-<meta name="identifier" content="{identifier}"/>
-<meta name="editing_roles" content="teachers"/>
-<meta name="workflow_state" content="active"/>
-</head>
-<body>
-<p><iframe style="overflow: hidden; height: 720px; width: 100%;" src="{base_url}/index.html#/{url_format}/{lesson_id}" loading="lazy"></iframe></p>
-</body>
-</html>"""
-    
-    return html_template, safe_title, identifier
 
-def extract_wiki_metadata(html_content):
-    """Extract metadata from an HTML file"""
+    return _PAGE_TEMPLATE.format(
+        lesson_title=html.escape(lesson_title),
+        identifier=identifier,
+        base_url=base_url,
+        url_format=url_format,
+        lesson_id=lesson_id
+    )
+
+class _WikiHeadParser(HTMLParser):
+    """Collect wiki page metadata from the <head> of an HTML document"""
+
+    def __init__(self):
+        super().__init__()
+        self.title = None
+        self.identifier = None
+        self.workflow_state = None
+        self.done = False
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == 'title':
+            self._in_title = True
+        elif tag == 'meta':
+            attrs = dict(attrs)
+            name = attrs.get('name')
+            if name == 'identifier':
+                self.identifier = attrs.get('content')
+            elif name == 'workflow_state':
+                self.workflow_state = attrs.get('content')
+
+    def handle_data(self, data):
+        if self._in_title and not self.done:
+            self.title = (self.title or "") + data
+
+    def handle_endtag(self, tag):
+        if tag == 'title':
+            self._in_title = False
+        elif tag == 'head':
+            # Everything we care about lives in <head>; stop feeding here
+            self.done = True
+
+# How many bytes of an uploaded HTML file to decode when reading metadata;
+# the <head> of a Canvas wiki page fits comfortably in this
+_WIKI_HEAD_BYTES = 16384
+
+def extract_wiki_metadata(html_bytes):
+    """Extract metadata from the raw bytes of an HTML file"""
+    parser = _WikiHeadParser()
     try:
-        # Find title
-        title_match = re.search(r'<title>(.*?)</title>', html_content)
-        title = title_match.group(1) if title_match else "Untitled Page"
-        
-        # Find identifier
-        identifier_match = re.search(r'<meta name="identifier" content="(.*?)"', html_content)
-        identifier = identifier_match.group(1) if identifier_match else f"g{uuid.uuid4().hex[:32]}"
-        
-        # Find workflow state
-        workflow_match = re.search(r'<meta name="workflow_state" content="(.*?)"', html_content)
-        workflow_state = workflow_match.group(1) if workflow_match else "active"
-        
-        return {
-            'title': title,
-            'identifier': identifier,
-            'workflow_state': workflow_state
-        }
-    except Exception as e:
-        return {
-            'title': "Untitled Page",
-            'identifier': f"g{uuid.uuid4().hex[:32]}",
-            'workflow_state': "active"
-        }
+        # Only the head region is ever decoded or scanned; the page body
+        # stays untouched bytes
+        head = html_bytes[:_WIKI_HEAD_BYTES].decode('utf-8', errors='ignore')
+        for start in range(0, len(head), 4096):
+            parser.feed(head[start:start + 4096])
+            if parser.done:
+                break
+        parser.close()
+    except Exception:
+        pass
+
+    return {
+        'title': parser.title if parser.title else "Untitled Page",
+        'identifier': parser.identifier if parser.identifier else f"g{_gid(32)}",
+        'workflow_state': parser.workflow_state if parser.workflow_state else "active"
+    }
 
 def create_imsmanifest(course_title, modules, additional_pages):
     """Create the imsmanifest.xml file for IMSCC"""
     
-    resources_xml = ""
-    modules_xml = ""
-    
+    # Accumulate fragments in lists and join once at the end, so the total
+    # string work stays linear in the size of the manifest
+    resources_parts = []
+    modules_parts = []
+
     # Create a unique identifier for the organization
-    org_identifier = f"org_{uuid.uuid4().hex[:8]}"
-    
+    org_identifier = f"org_{_gid(8)}"
+
     # Create content for each module
     for i, module in enumerate(modules):
-        module_id = f"g{uuid.uuid4().hex[:32]}"
-        
+        module_id = f"g{_gid(32)}"
+
         # Create module item
-        modules_xml += f"""
+        modules_parts.append(f"""
         <item identifier="{module_id}">
-            <title>{module['title']}</title>"""
-        
+            <title>{escape(module['title'])}</title>""")
+
         # Add pages to the module
         for page in module['pages']:
             # Get page metadata
-            safe_filename = f"{create_safe_filename(page['name'])}.html"
-            page_identifier = page['identifier']
-            
+            safe_filename = page.safe_filename
+            page_identifier = page.identifier
+
             # Create item entry in the module
-            modules_xml += f"""
-            <item identifier="g{uuid.uuid4().hex[:32]}" identifierref="{page_identifier}">
-                <title>{page['name']}</title>
-            </item>"""
-            
+            modules_parts.append(f"""
+            <item identifier="g{_gid(32)}" identifierref="{page_identifier}">
+                <title>{escape(page.name)}</title>
+            </item>""")
+
             # Create resource entry using the page's identifier
-            resources_xml += f"""
+            resources_parts.append(f"""
     <resource type="webcontent" identifier="{page_identifier}" href="wiki_content/{safe_filename}">
         <file href="wiki_content/{safe_filename}"/>
-    </resource>"""
-        
+    </resource>""")
+
         # Close the module item
-        modules_xml += """
-        </item>"""
-    
-    # Add additional HTML pages as resources if any
+        modules_parts.append("""
+        </item>""")
+
+    # Add additional HTML pages as resources if any; identifier and
+    # filename are user-controlled (meta tag / upload name), so quote them
     for page in additional_pages:
-        resources_xml += f"""
-    <resource type="webcontent" identifier="{page['identifier']}" href="wiki_content/{page['filename']}">
-        <file href="wiki_content/{page['filename']}"/>
-    </resource>"""
+        href = quoteattr(f"wiki_content/{page['filename']}")
+        resources_parts.append(f"""
+    <resource type="webcontent" identifier={quoteattr(page['identifier'])} href={href}>
+        <file href={href}/>
+    </resource>""")
+
+    modules_xml = "".join(modules_parts)
+    resources_xml = "".join(resources_parts)
     
     # Create organizations structure with LearningModules
     organizations_xml = f"""
@@ -251,105 +406,89 @@ def create_imsmanifest(course_title, modules, additional_pages):
         </organization>
     </organizations>"""
     
-    manifest_xml = f"""<?xml version="1.0" encoding="UTF-8"?>
-<manifest identifier="manifest_{uuid.uuid4().hex[:8]}" 
-         xmlns="http://www.imsglobal.org/xsd/imsccv1p1/imscp_v1p1" 
-         xmlns:lom="http://ltsc.ieee.org/xsd/imsccv1p1/LOM/resource" 
-         xmlns:lomimscc="http://ltsc.ieee.org/xsd/imsccv1p1/LOM/manifest" 
-         xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" 
-         xsi:schemaLocation="http://www.imsglobal.org/xsd/imsccv1p1/imscp_v1p1 http://www.imsglobal.org/profile/cc/ccv1p1/ccv1p1_imscp_v1p2_v1p0.xsd http://ltsc.ieee.org/xsd/imsccv1p1/LOM/resource http://www.imsglobal.org/profile/cc/ccv1p1/LOM/ccv1p1_lomresource_v1p0.xsd http://ltsc.ieee.org/xsd/imsccv1p1/LOM/manifest http://www.imsglobal.org/profile/cc/ccv1p1/LOM/ccv1p1_lommanifest_v1p0.xsd">
-  <metadata>
-    <schema>IMS Common Cartridge</schema>
-    <schemaversion>1.1.0</schemaversion>
-    <lomimscc:lom>
-      <lomimscc:general>
-        <lomimscc:title>
-          <lomimscc:string>{course_title}</lomimscc:string>
-        </lomimscc:title>
-      </lomimscc:general>
-    </lomimscc:lom>
-  </metadata>
-  {organizations_xml}
-  <resources>
-    {resources_xml}
-  </resources>
-</manifest>
-"""
-    
-    return manifest_xml
+    return _MANIFEST_TEMPLATE.format(
+        manifest_id=_gid(8),
+        course_title=escape(course_title),
+        organizations=organizations_xml,
+        resources=resources_xml
+    )
 
 def create_module_meta(modules, additional_pages, course_title):
     """Create the module_meta.xml file for Canvas"""
     
-    modules_xml = ""
-    
+    # Accumulate fragments and join once, mirroring create_imsmanifest
+    modules_parts = []
+
     # Create module entries for the Rise content
     for i, module in enumerate(modules):
-        module_id = f"m_{uuid.uuid4().hex[:8]}"
-        
-        items_xml = ""
+        module_id = f"m_{_gid(8)}"
+
+        items_parts = []
         for j, page in enumerate(module['pages']):
-            item_id = f"i_{uuid.uuid4().hex[:8]}"
-            
+            item_id = f"i_{_gid(8)}"
+
             # Use the identifier stored in the page object
-            page_identifier = page['identifier']
-            
+            page_identifier = page.identifier
+
             # Create item with WikiPage content_type and link_settings_json
-            items_xml += f"""
+            items_parts.append(f"""
       <item identifier="{item_id}">
         <content_type>WikiPage</content_type>
         <workflow_state>active</workflow_state>
-        <title>{page['name']}</title>
+        <title>{escape(page.name)}</title>
         <identifierref>{page_identifier}</identifierref>
         <position>{j+1}</position>
         <new_tab/>
         <indent>0</indent>
         <link_settings_json>null</link_settings_json>
-      </item>"""
-        
-        modules_xml += f"""
+      </item>""")
+
+        modules_parts.append(f"""
   <module identifier="{module_id}">
-    <title>{module['title']}</title>
+    <title>{escape(module['title'])}</title>
     <workflow_state>active</workflow_state>
     <position>{i+1}</position>
-    <items>{items_xml}
+    <items>{"".join(items_parts)}
     </items>
-  </module>"""
-    
+  </module>""")
+
     # Create "Additional Content" module for the additional HTML pages if they exist
     if additional_pages:
-        additional_module_id = f"m_{uuid.uuid4().hex[:8]}"
-        
-        items_xml = ""
+        additional_module_id = f"m_{_gid(8)}"
+
+        items_parts = []
         for j, page in enumerate(additional_pages):
-            item_id = f"i_{uuid.uuid4().hex[:8]}"
-            
-            # Use the identifier from the page
-            page_identifier = page['identifier']
-            
+            item_id = f"i_{_gid(8)}"
+
+            # Identifier and workflow_state come from the uploaded page's
+            # meta tags, so escape them like the title
+            page_identifier = escape(page['identifier'])
+
             # Create item with WikiPage content_type and link_settings_json
-            items_xml += f"""
+            items_parts.append(f"""
       <item identifier="{item_id}">
         <content_type>WikiPage</content_type>
-        <workflow_state>{page['workflow_state']}</workflow_state>
-        <title>{page['title']}</title>
+        <workflow_state>{escape(page['workflow_state'])}</workflow_state>
+        <title>{escape(page['title'])}</title>
         <identifierref>{page_identifier}</identifierref>
         <position>{j+1}</position>
         <new_tab/>
         <indent>0</indent>
         <link_settings_json>null</link_settings_json>
-      </item>"""
-        
+      </item>""")
+
         # Add additional content module at the end
-        modules_xml += f"""
+        modules_parts.append(f"""
   <module identifier="{additional_module_id}">
     <title>Additional Content</title>
     <workflow_state>active</workflow_state>
     <position>{len(modules)+1}</position>
-    <items>{items_xml}
+    <items>{"".join(items_parts)}
     </items>
-  </module>"""
-    
+  </module>""")
+
+    modules_xml = "".join(modules_parts)
+
     module_meta_xml = f"""<?xml version="1.0" encoding="UTF-8"?>
 <modules xmlns="http://canvas.instructure.com/xsd/cccv1p0" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://canvas.instructure.com/xsd/cccv1p0 https://canvas.instructure.com/xsd/cccv1p0.xsd">{modules_xml}
 </modules>
@@ -359,67 +498,20 @@ def create_module_meta(modules, additional_pages, course_title):
 
 def create_course_settings(course_title, modules, additional_pages):
     """Create necessary course settings files for IMSCC"""
-    
-    # Create course_settings/canvas_export.txt
-    canvas_export = "1"
-    
-    # Create course_settings/course_settings.xml
-    course_settings_xml = f"""<?xml version="1.0" encoding="UTF-8"?>
-<course identifier="{uuid.uuid4().hex}" xmlns="http://canvas.instructure.com/xsd/cccv1p0" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://canvas.instructure.com/xsd/cccv1p0 https://canvas.instructure.com/xsd/cccv1p0.xsd">
-  <title>{course_title}</title>
-  <course_code></course_code>
-  <locale>en</locale>
-  <settings>
-    <setting name="hide_final_grades">false</setting>
-    <setting name="allow_student_discussion_topics">true</setting>
-    <setting name="allow_student_discussion_editing">true</setting>
-    <setting name="allow_student_forum_attachments">false</setting>
-    <setting name="allow_student_organized_groups">false</setting>
-    <setting name="show_all_discussion_entries">false</setting>
-    <setting name="is_public">false</setting>
-    <setting name="open_enrollment">false</setting>
-    <setting name="allow_wiki_comments">false</setting>
-    <setting name="self_enrollment">false</setting>
-    <setting name="allow_student_assignment_edits">false</setting>
-    <setting name="allow_student_discussion_reporting">true</setting>
-    <setting name="restrict_student_past_view">false</setting>
-    <setting name="restrict_student_future_view">false</setting>
-    <setting name="grading_standard_enabled">false</setting>
-  </settings>
-  <date_format>iso8601</date_format>
-</course>
-"""
-    
+
+    # Create course_settings/course_settings.xml from the shared template
+    course_settings_xml = _COURSE_SETTINGS_TEMPLATE.format(
+        course_id=_gid(32),
+        course_title=escape(course_title)
+    )
+
     # Create module_meta.xml with the proper module structure
     module_meta_xml = create_module_meta(modules, additional_pages, course_title)
-    
-    # Create other necessary empty files
-    other_files = {
-        "course_settings/assignment_groups.xml": """<?xml version="1.0" encoding="UTF-8"?>
-<assignmentGroups xmlns="http://canvas.instructure.com/xsd/cccv1p0" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://canvas.instructure.com/xsd/cccv1p0 https://canvas.instructure.com/xsd/cccv1p0.xsd">
-</assignmentGroups>
-""",
-        "course_settings/files_meta.xml": """<?xml version="1.0" encoding="UTF-8"?>
-<files xmlns="http://canvas.instructure.com/xsd/cccv1p0" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://canvas.instructure.com/xsd/cccv1p0 https://canvas.instructure.com/xsd/cccv1p0.xsd">
-</files>
-""",
-        "course_settings/media_tracks.xml": """<?xml version="1.0" encoding="UTF-8"?>
-<media_tracks xmlns="http://canvas.instructure.com/xsd/cccv1p0" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://canvas.instructure.com/xsd/cccv1p0 https://canvas.instructure.com/xsd/cccv1p0.xsd">
-</media_tracks>
-""",
-        "course_settings/context.xml": """<?xml version="1.0" encoding="UTF-8"?>
-<course_components xmlns="http://canvas.instructure.com/xsd/cccv1p0" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://canvas.instructure.com/xsd/cccv1p0 https://canvas.instructure.com/xsd/cccv1p0.xsd">
-  <resource content_type="associated_content" identifierref="" intendeduse="syllabus" type="syllabus">
-  </resource>
-</course_components>
-"""
-    }
-    
+
     return {
-        "course_settings/canvas_export.txt": canvas_export,
         "course_settings/course_settings.xml": course_settings_xml,
         "course_settings/module_meta.xml": module_meta_xml,
-        **other_files
+        **_STATIC_COURSE_SETTINGS
     }
 
 def process_additional_html(html_files):
@@ -428,93 +520,100 @@ def process_additional_html(html_files):
     
     for html_file in html_files:
         try:
-            # Read HTML content
-            html_content = html_file.read().decode('utf-8')
-            
+            # Keep the raw bytes; they go into the ZIP untouched
+            html_bytes = html_file.getvalue()
+
             # Extract metadata
-            metadata = extract_wiki_metadata(html_content)
-            
+            metadata = extract_wiki_metadata(html_bytes)
+
             # Add to additional pages
             additional_pages.append({
                 'title': metadata['title'],
                 'identifier': metadata['identifier'],
                 'workflow_state': metadata['workflow_state'],
                 'filename': html_file.name,
-                'content': html_content
+                'content': html_bytes
             })
         except Exception as e:
             st.warning(f"Error processing {html_file.name}: {str(e)}")
     
     return additional_pages
 
-def create_imscc_package(activities, course_info, base_url, url_format, additional_html_files):
-    """Create an IMSCC package with the extracted activities organized into modules"""
-    
-    # Organize activities into modules based on sections
-    modules = organize_activities(activities)
-    
-    # First, assign identifiers to all pages
+def write_zip_member(zf, arcname, data, compress_level=1):
+    """Write one archive member with fixed metadata.
+
+    The fixed timestamp and mode make package builds reproducible for
+    identical input. compress_level must be passed explicitly: with a
+    caller-supplied ZipInfo, writestr ignores the level set on the ZipFile
+    and would fall back to zlib's default.
+    """
+    info = zipfile.ZipInfo(arcname, date_time=(1980, 1, 1, 0, 0, 0))
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = 0o100644 << 16
+    zf.writestr(info, data, compresslevel=compress_level)
+
+def create_imscc_package(modules, course_info, base_url, url_format, additional_html_files, compress_level=1):
+    """Create an IMSCC package from the organized modules"""
+
+    # First, assign identifiers and archive filenames to all pages; the
+    # manifest, module_meta and the ZIP writes all reuse these
     for module in modules:
         for page in module['pages']:
-            page['identifier'] = generate_page_identifier()
+            page.identifier = generate_page_identifier()
+            page.safe_filename = f"{create_safe_filename(page.name)}.html"
     
     # Process additional HTML files
     additional_pages = process_additional_html(additional_html_files)
     
-    with tempfile.TemporaryDirectory() as temp_dir:
-        # Create directory structure
-        wiki_dir = os.path.join(temp_dir, "wiki_content")
-        course_settings_dir = os.path.join(temp_dir, "course_settings")
-        os.makedirs(wiki_dir, exist_ok=True)
-        os.makedirs(course_settings_dir, exist_ok=True)
-        
-        # Create HTML files for each page in each module
-        for module in modules:
-            for page in module['pages']:
-                # Use the already assigned identifier
-                html_content, safe_title, _ = create_html_page(page['id'], page['name'], base_url, url_format, page['identifier'])
-                page_filename = f"{safe_title}.html"
-                with open(os.path.join(wiki_dir, page_filename), 'w', encoding='utf-8') as f:
-                    f.write(html_content)
-        
-        # Save additional HTML files
-        for page in additional_pages:
-            with open(os.path.join(wiki_dir, page['filename']), 'w', encoding='utf-8') as f:
-                f.write(page['content'])
-        
-        # Create imsmanifest.xml using the identifiers in the pages
-        manifest_content = create_imsmanifest(course_info['title'], modules, additional_pages)
-        with open(os.path.join(temp_dir, "imsmanifest.xml"), 'w', encoding='utf-8') as f:
-            f.write(manifest_content)
-        
-        # Create course settings files also using the identifiers in the pages
-        course_settings = create_course_settings(course_info['title'], modules, additional_pages)
-        for file_path, content in course_settings.items():
-            full_path = os.path.join(temp_dir, file_path)
-            os.makedirs(os.path.dirname(full_path), exist_ok=True)
-            with open(full_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-        
-        # Create a ZIP file with .imscc extension
-        memory_file = io.BytesIO()
-        with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for root, dirs, files in os.walk(temp_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, temp_dir)
-                    zf.write(file_path, arcname)
-        
-        memory_file.seek(0)
-        return memory_file, len(modules), len(additional_pages)
+    # Collect every member first so they can be written in a stable order
+    members = {}
+
+    # Render HTML for every page; each render is an independent pure call,
+    # so large courses fan out across a thread pool
+    all_pages = [page for module in modules for page in module['pages']]
+
+    def render_page(page):
+        # Use the already assigned identifier
+        html_content = create_html_page(page.id, page.name, base_url, url_format, page.identifier)
+        return f"wiki_content/{page.safe_filename}", html_content.encode('utf-8')
+
+    if len(all_pages) < _PARALLEL_RENDER_MIN:
+        members.update(render_page(page) for page in all_pages)
+    else:
+        with ThreadPoolExecutor() as executor:
+            members.update(executor.map(render_page, all_pages))
+
+    # Save additional HTML files
+    for page in additional_pages:
+        members[f"wiki_content/{page['filename']}"] = page['content']
+
+    # Create course settings files also using the identifiers in the pages
+    course_settings = create_course_settings(course_info['title'], modules, additional_pages)
+    members.update((path, content.encode('utf-8')) for path, content in course_settings.items())
+
+    # Create imsmanifest.xml using the identifiers in the pages
+    manifest_content = create_imsmanifest(course_info['title'], modules, additional_pages).encode('utf-8')
+
+    # Spooled buffer: small packages stay in memory, large ones spill to
+    # disk instead of holding the whole archive in RAM
+    memory_file = tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024)
+    # Level 1 deflate by default: the package is small, highly templated
+    # text, so zlib's level 6 burns CPU for a few percent of extra shrink
+    with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED, compresslevel=compress_level) as zf:
+        # Manifest first, then everything else sorted by archive path
+        write_zip_member(zf, "imsmanifest.xml", manifest_content, compress_level)
+        for arcname in sorted(members):
+            write_zip_member(zf, arcname, members[arcname], compress_level)
+
+    memory_file.seek(0)
+    return memory_file, len(modules), len(additional_pages)
 
 if uploaded_file is not None and base_url:
     # Process the uploaded file
     try:
-        xml_content = uploaded_file.read().decode('utf-8')
-        
-        # Extract activities and course info
-        activities = extract_activities(xml_content)
-        course_info = get_course_info(xml_content)
+        # Extract activities and course info in a single streaming pass
+        # getvalue() hands back the upload buffer without a copy or decode
+        activities, course_info = parse_tincan(uploaded_file.getvalue())
         
         # Organize into modules
         modules = organize_activities(activities)
@@ -530,34 +629,43 @@ if uploaded_file is not None and base_url:
             for html_file in additional_html_files:
                 st.write(f"- {html_file.name}")
         
-        # Display modules and pages
+        # Display modules and pages in one dataframe instead of one st.write
+        # call per row; only the displayed columns are materialized
         st.subheader("Modules and Pages Structure")
-        for i, module in enumerate(modules):
-            st.write(f"**Module {i+1}: {module['title']}**")
-            for page in module['pages']:
-                st.write(f"- Page: {page['name']}")
+        structure_rows = [
+            {'Module': module['title'], 'Page': page.name, 'Type': page.type}
+            for module in modules
+            for page in module['pages']
+        ]
+        if structure_rows:
+            st.dataframe(structure_rows, use_container_width=True)
+        else:
+            st.write("No modules or pages found in this file.")
         
         # Create IMSCC package button
         if st.button("Generate IMSCC Package"):
             with st.spinner("Generating IMSCC package..."):
                 zipfile_bytes, module_count, additional_count = create_imscc_package(
-                    activities, course_info, base_url, url_format, additional_html_files)
+                    modules, course_info, base_url, url_format, additional_html_files, compress_level)
                 
                 # Create download button
                 timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-                course_name = re.sub(r'[^\w\s-]', '', course_info['title']).strip().lower()
-                course_name = re.sub(r'[-\s]+', '-', course_name)
+                course_name = create_safe_filename(course_info['title'])
                 filename = f"{course_name}_{timestamp}.imscc"
                 
                 st.success(f"IMSCC package generated successfully with {module_count} modules and {additional_count} additional pages!")
                 
-                # Provide download link
-                b64 = base64.b64encode(zipfile_bytes.getvalue()).decode()
-                href = f'<a href="data:application/zip;base64,{b64}" download="{filename}">Download IMSCC Package</a>'
-                st.markdown(href, unsafe_allow_html=True)
+                # Provide download button streaming the raw bytes;
+                # download_button does not accept SpooledTemporaryFile, so
+                # hand it the bytes explicitly
+                st.download_button(
+                    label="Download IMSCC Package",
+                    data=zipfile_bytes.read(),
+                    file_name=filename,
+                    mime="application/zip"
+                )
     except Exception as e:
         st.error(f"Error processing the file: {str(e)}")
-        import traceback
         st.error(traceback.format_exc())
 else:
     # Show instructions